@@ -1,24 +1,148 @@
 import argparse
-import requests
+import copy
+import csv
+import ctypes
 import os
 import sys
 import subprocess
+import hashlib
 import json
-import tempfile
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from fpdf import FPDF
-from fpdf.enums import XPos, YPos
 from io import BytesIO
-from PIL import Image
 from datetime import datetime
 
-# Try to import Keeper Commander SDK
+# orjson decodes JSON several times faster than the stdlib; fall back if missing
 try:
-    from keepercommander import api
-    from keepercommander.__main__ import get_params_from_config
-    KEEPER_AVAILABLE = True
+    import orjson
+    _json_loads = orjson.loads
 except ImportError:
-    KEEPER_AVAILABLE = False
+    _json_loads = json.loads
+
+# Heavy third-party imports (requests, fpdf, keepercommander) are deferred to
+# the functions that need them, so --help, argument errors and cache-hit paths
+# skip several hundred milliseconds of interpreter startup.
+
+# Shared session so the Routes and Static Maps calls reuse keep-alive connections
+# instead of paying a fresh TCP+TLS handshake per request. When httpx (with its
+# http2 extra) is installed, HTTP/2 multiplexes all requests over one stream.
+_SESSION = None
+_SESSION_IS_HTTP2 = False
+
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _get_session():
+    """Return the shared HTTP client, creating it (and importing it) lazily."""
+    global _SESSION, _SESSION_IS_HTTP2
+    if _SESSION is None:
+        try:
+            import httpx
+            _SESSION = httpx.Client(http2=True, timeout=30)
+            _SESSION_IS_HTTP2 = True
+        except ImportError:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            # Retry transient Google errors (quota, gateway hiccups) with
+            # exponential backoff instead of aborting the whole run.
+            retry = Retry(
+                total=5,
+                backoff_factor=0.5,
+                status_forcelist=list(_RETRY_STATUSES),
+                allowed_methods=["GET", "POST"],
+            )
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(max_retries=retry, pool_maxsize=8))
+            _SESSION = session
+    return _SESSION
+
+
+def _request(method, url, **kwargs):
+    """Issue an HTTP request on the shared client.
+
+    The requests fallback retries transient statuses inside its adapter; on
+    the httpx path the same backoff is applied here.
+    """
+    session = _get_session()
+    if not _SESSION_IS_HTTP2:
+        return session.request(method, url, **kwargs)
+    for attempt in range(5):
+        response = session.request(method, url, **kwargs)
+        if response.status_code not in _RETRY_STATUSES:
+            break
+        time.sleep(0.5 * (2 ** attempt))
+    return response
+
+
+def _check_response(response, action):
+    """Raise a uniform error for any non-success response.
+
+    The status-code comparison works for requests and httpx responses alike
+    and keeps the error formatting (which touches response.text) off the
+    success path.
+    """
+    if response.status_code >= 400:
+        # Google error pages can run to hundreds of kilobytes; the first 512
+        # characters are plenty to diagnose the failure.
+        snippet = response.text[:512]
+        raise Exception(f"Error {action}: {response.status_code} - {snippet}")
+
+# On-disk cache of Google Maps responses, so repeat runs with identical inputs
+# (a common dev/debug loop) skip the network entirely.
+_CACHE_DIR = Path.home() / ".cache" / "er-maps-generator"
+_CACHE_MAX_AGE = 86400 * 30  # 30 days
+
+_PY_VER = f"{sys.version_info.major}.{sys.version_info.minor}"
+
+# Static map request geometry; also used to size the image in the PDF so the
+# layout does not depend on probing the downloaded bytes.
+_MAP_SIZE = "1200x800"
+_MAP_SCALE = 2
+
+# PDF skeleton (page + font setup) built once and deep-copied per route, so
+# batch runs skip re-running fpdf2's fixed setup for every document.
+_PDF_TEMPLATE = None
+
+
+def _new_pdf():
+    """Return a fresh FPDF with the page added and the body font selected."""
+    global _PDF_TEMPLATE
+    if _PDF_TEMPLATE is None:
+        from fpdf import FPDF
+        template = FPDF()
+        template.add_page()
+        template.set_font("Helvetica", size=10)
+        _PDF_TEMPLATE = template
+    return copy.deepcopy(_PDF_TEMPLATE)
+
+
+def _cache_path(kind, *parts):
+    """Build the cache file path for a response, keyed by a hash of its inputs."""
+    digest = hashlib.blake2b("|".join(parts).encode("utf-8")).hexdigest()
+    return _CACHE_DIR / f"{kind}_{digest}"
+
+
+def _cache_get(path):
+    """Return cached bytes if present and fresh, else None."""
+    try:
+        if time.time() - path.stat().st_mtime < _CACHE_MAX_AGE:
+            return path.read_bytes()
+    except OSError:
+        pass
+    return None
+
+
+def _cache_set(path, data):
+    """Store bytes in the cache, ignoring filesystem errors (cache is best-effort)."""
+    try:
+        _CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    except OSError:
+        pass
 
 
 def load_config(config_path):
@@ -43,6 +167,34 @@ def load_config(config_path):
 
 def get_api_key_from_keychain(username, service_name):
     """Fetch API key securely from macOS Keychain."""
+    # Call the Security framework in-process; spawning /usr/bin/security costs a
+    # full fork+exec per lookup, which dwarfs the actual keychain query.
+    try:
+        security = ctypes.CDLL("/System/Library/Frameworks/Security.framework/Security")
+    except OSError:
+        return _get_api_key_from_keychain_cli(username, service_name)
+
+    service = service_name.encode("utf-8")
+    account = username.encode("utf-8")
+    length = ctypes.c_uint32(0)
+    data = ctypes.c_void_p()
+    status = security.SecKeychainFindGenericPassword(
+        None,
+        len(service), service,
+        len(account), account,
+        ctypes.byref(length), ctypes.byref(data),
+        None,
+    )
+    if status != 0:
+        raise Exception(f"Failed to retrieve API key: SecKeychainFindGenericPassword returned OSStatus {status}")
+
+    try:
+        return ctypes.string_at(data, length.value).decode("utf-8").strip()
+    finally:
+        security.SecKeychainItemFreeContent(None, data)
+
+def _get_api_key_from_keychain_cli(username, service_name):
+    """Fallback keychain lookup via the `security` command-line tool."""
     try:
         result = subprocess.run(
             ["security", "find-generic-password", "-a", username, "-s", service_name, "-w"],
@@ -54,9 +206,44 @@ def get_api_key_from_keychain(username, service_name):
     except subprocess.CalledProcessError as e:
         raise Exception(f"Failed to retrieve API key: {e.stderr.strip()}")
 
+def _store_api_key_in_keychain(username, service_name, secret):
+    """Best-effort write of a secret to the macOS Keychain (-U updates in place)."""
+    try:
+        subprocess.run(
+            ["security", "add-generic-password", "-U", "-a", username, "-s", service_name, "-w", secret],
+            check=True,
+            text=True,
+            capture_output=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        pass
+
 def get_api_key_from_keeper(record_uid):
+    """Fetch API key from Keeper Security, caching it in the macOS Keychain.
+
+    A Keeper fetch means a full login plus vault sync-down (multiple seconds),
+    so after the first run the key is stored in the Keychain under a service
+    name derived from the record UID and read back via the fast keychain path.
+    """
+    cache_account = os.environ.get("USER") or "er-maps-generator"
+    cache_service = f"er-maps-generator.keeper.{record_uid}"
+    try:
+        cached = get_api_key_from_keychain(cache_account, cache_service)
+        if cached:
+            return cached
+    except Exception:
+        pass
+
+    api_key = _fetch_api_key_from_keeper(record_uid)
+    _store_api_key_in_keychain(cache_account, cache_service, api_key)
+    return api_key
+
+def _fetch_api_key_from_keeper(record_uid):
     """Fetch API key from Keeper Security using Keeper Commander SDK."""
-    if not KEEPER_AVAILABLE:
+    try:
+        from keepercommander import api
+        from keepercommander.__main__ import get_params_from_config
+    except ImportError:
         raise Exception("Keeper Commander SDK is not installed. Please run 'pip install keepercommander'.")
 
     config_path = os.path.expanduser('~/.keeper/config.json')
@@ -92,12 +279,19 @@ def get_api_key_from_keeper(record_uid):
 
 def get_route_and_distance(api_key, origin, destination):
     """Fetch route and distance using Google Maps Routes API."""
-    response = requests.post(
+    cache_file = _cache_path("route", origin, destination, "DRIVE")
+    cached = _cache_get(cache_file)
+    if cached is not None:
+        distance, duration, polyline = _json_loads(cached)
+        return distance, duration, polyline
+
+    response = _request(
+        "POST",
         "https://routes.googleapis.com/directions/v2:computeRoutes",
         headers={
             "Content-Type": "application/json",
             "X-Goog-Api-Key": api_key,
-            "X-Goog-FieldMask": "routes.distanceMeters,routes.duration,routes.polyline.encodedPolyline,routes.localizedValues",
+            "X-Goog-FieldMask": "routes.distanceMeters,routes.polyline.encodedPolyline,routes.localizedValues.duration",
         },
         json={
             "origin": {"address": origin},
@@ -110,10 +304,9 @@ def get_route_and_distance(api_key, origin, destination):
         timeout=30,
     )
 
-    if response.status_code != 200:
-        raise Exception(f"Error fetching directions: {response.status_code} - {response.text}")
+    _check_response(response, "fetching directions")
 
-    data = response.json()
+    data = _json_loads(response.content)
     if not data.get("routes"):
         raise Exception(f"No routes found. Response: {data}")
 
@@ -122,62 +315,142 @@ def get_route_and_distance(api_key, origin, destination):
     duration = route["localizedValues"]["duration"]["text"]
     polyline = route["polyline"]["encodedPolyline"]
 
+    _cache_set(cache_file, json.dumps([distance, duration, polyline]).encode("utf-8"))
     return distance, duration, polyline
 
+def compute_route_matrix(api_key, origin, destinations):
+    """Fetch distances and durations for one origin against many destinations.
+
+    Uses the Routes API computeRouteMatrix endpoint, collapsing up to 25
+    origin/destination pairs into a single HTTP call. The matrix does not
+    return polylines, so this path is for map-less batch runs.
+    """
+    results = []
+    # computeRouteMatrix caps origins x destinations at 25 elements per request
+    for start in range(0, len(destinations), 25):
+        chunk = destinations[start:start + 25]
+        response = _request(
+            "POST",
+            "https://routes.googleapis.com/distanceMatrix/v2:computeRouteMatrix",
+            headers={
+                "Content-Type": "application/json",
+                "X-Goog-Api-Key": api_key,
+                "X-Goog-FieldMask": "originIndex,destinationIndex,condition,distanceMeters,localizedValues",
+            },
+            json={
+                "origins": [{"waypoint": {"address": origin}}],
+                "destinations": [{"waypoint": {"address": d}} for d in chunk],
+                "travelMode": "DRIVE",
+                "routingPreference": "TRAFFIC_AWARE",
+                "units": "METRIC",
+                "languageCode": "en-US",
+            },
+            timeout=30,
+        )
+
+        _check_response(response, "fetching route matrix")
+
+        chunk_results = [None] * len(chunk)
+        for element in _json_loads(response.content):
+            if element.get("condition") != "ROUTE_EXISTS":
+                continue
+            distance = element["distanceMeters"] / 1000  # Convert meters to kilometers
+            duration = element["localizedValues"]["duration"]["text"]
+            chunk_results[element["destinationIndex"]] = (distance, duration)
+
+        for destination, result in zip(chunk, chunk_results):
+            if result is None:
+                raise Exception(f"No route found from {origin} to {destination}.")
+        results.extend(chunk_results)
+
+    return results
+
 def generate_map_with_route(api_key, polyline):
     """Generate a static map with the route using Google Static Maps API."""
-    response = requests.get("https://maps.googleapis.com/maps/api/staticmap", params={
-        "size": "1200x800",
-        "scale": 2,
+    # Keyed on the polyline itself, so different address spellings that resolve
+    # to the same route still hit the cache.
+    cache_file = _cache_path("map", polyline, _MAP_SIZE, str(_MAP_SCALE), "jpg")
+    cached = _cache_get(cache_file)
+    if cached is not None:
+        return BytesIO(cached)
+
+    _get_session()  # ensure the client exists so _SESSION_IS_HTTP2 is settled
+    params = {
+        "size": _MAP_SIZE,
+        "scale": _MAP_SCALE,
         "maptype": "roadmap",
+        # JPEG is 4-8x smaller than the default PNG for a roadmap and fpdf2
+        # embeds it without re-encoding.
+        "format": "jpg",
         "path": f"enc:{polyline}",
         "key": api_key
-    }, timeout=30)
-    
-    if response.status_code != 200:
-        raise Exception(f"Error generating map: {response.status_code} - {response.text}")
-    
-    return BytesIO(response.content)
+    }
+    url = "https://maps.googleapis.com/maps/api/staticmap"
+    if _SESSION_IS_HTTP2:
+        response = _request("GET", url, params=params, timeout=30)
+        _check_response(response, "generating map")
+        buf = BytesIO(response.content)
+    else:
+        # Stream the body straight into the buffer instead of materializing
+        # response.content first and copying it into BytesIO a second time.
+        response = _request("GET", url, params=params, stream=True, timeout=30)
+        _check_response(response, "generating map")
+        buf = BytesIO()
+        response.raw.decode_content = True
+        shutil.copyfileobj(response.raw, buf, length=64 * 1024)
+        buf.seek(0)
+    _cache_set(cache_file, buf.getvalue())
+    return buf
         
-def create_pdf(api_key, origin, destination, output_file=None):
-    """Generate a PDF with the route map, distance, duration, and estimated cost."""
+def create_pdf(api_key, origin, destination, output_file=None, route=None):
+    """Generate a PDF with the route map, distance, duration, and estimated cost.
+
+    `route` may carry a precomputed (distance, duration, polyline) tuple, e.g.
+    from compute_route_matrix; a None polyline skips the map image.
+    """
+    from fpdf.enums import XPos, YPos
+
+    # One timestamp per PDF, so the filename and footer refer to the same instant
+    now = datetime.now()
     if output_file is None:
-        timestamp = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
-        output_file = f"route_map_{timestamp}.pdf"
-    
+        output_file = f"route_map_{now.strftime('%Y-%m-%dT%H-%M-%S')}.pdf"
+
     # Get route data
-    distance, duration, polyline = get_route_and_distance(api_key, origin, destination)
+    if route is None:
+        route = get_route_and_distance(api_key, origin, destination)
+    distance, duration, polyline = route
     price_per_km = 0.3
     estimated_cost = distance * price_per_km
     return_trip_cost = estimated_cost * 2
-    
+
     # Generate map
-    map_image = generate_map_with_route(api_key, polyline)
-    
-    # Create PDF
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Helvetica", size=10)
-    
-    # Add route information
-    pdf.cell(0, 8, f"Origin: {origin}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-    pdf.cell(0, 8, f"Destination: {destination}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-    pdf.cell(0, 8, f"Distance: {distance:.2f} km", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-    pdf.cell(0, 8, f"Estimated Travel Time: {duration}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-    pdf.cell(0, 8, f"Estimated Cost (One-way): {estimated_cost:.2f} EUR", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-    pdf.cell(0, 8, f"Estimated Cost (Return trip): {return_trip_cost:.2f} EUR", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    map_image = generate_map_with_route(api_key, polyline) if polyline else None
+
+    # Create PDF from the precompiled skeleton
+    pdf = _new_pdf()
+
+    # Add route information in a single layout pass
+    info = "\n".join([
+        f"Origin: {origin}",
+        f"Destination: {destination}",
+        f"Distance: {distance:.2f} km",
+        f"Estimated Travel Time: {duration}",
+        f"Estimated Cost (One-way): {estimated_cost:.2f} EUR",
+        f"Estimated Cost (Return trip): {return_trip_cost:.2f} EUR",
+    ])
+    pdf.multi_cell(0, 8, info, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
     
-    # Add map image using secure temp file
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as temp_file:
-        temp_map_filename = temp_file.name
-        Image.open(map_image).save(temp_map_filename)
-        pdf.image(temp_map_filename, x=10, y=pdf.get_y() + 10, w=190)
-    os.unlink(temp_map_filename)
+    # Add map image straight from memory; the JPEG bytes are embedded verbatim
+    # (no decode), and the target height comes from the known request geometry
+    if map_image is not None:
+        map_image.seek(0)
+        map_w, map_h = (int(n) for n in _MAP_SIZE.split("x"))
+        pdf.image(map_image, x=10, y=pdf.get_y() + 10, w=190, h=190 * map_h / map_w)
     
     # Add footer
     pdf.ln(200)
     pdf.set_font("Helvetica", size=8)
-    footer_text = f"Generated with Python {sys.version_info.major}.{sys.version_info.minor} by Christophe Trefois ({datetime.now().strftime('%Y-%m-%d')})"
+    footer_text = f"Generated with Python {_PY_VER} by Christophe Trefois ({now.strftime('%Y-%m-%d')})"
     pdf.cell(0, 10, footer_text, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
     
     # Save PDF
@@ -190,9 +463,12 @@ def main():
     parser.add_argument("--username", help="macOS username to fetch the API key from Keychain")
     parser.add_argument("--keychain_service", help="Service name in macOS Keychain to fetch the API key")
     parser.add_argument("--keeper-uid", help="Keeper Security Record UID to fetch the API key")
-    parser.add_argument("--origin", help="Origin address")
-    parser.add_argument("--destination", help="Destination address")
-    parser.add_argument("--output", help="Output PDF filename")
+    parser.add_argument("--origin", action="append", help="Origin address (repeat together with --destination for multiple routes)")
+    parser.add_argument("--destination", action="append", help="Destination address (repeat together with --origin for multiple routes)")
+    parser.add_argument("--output", help="Output PDF filename (used as a base name when generating multiple routes)")
+    parser.add_argument("--routes-file", help="CSV file of origin,destination pairs to generate in one run")
+    parser.add_argument("--no-maps", action="store_true",
+                        help="Skip the static map images and batch distance lookups into route-matrix requests (one HTTP call per 25 pairs)")
     args = parser.parse_args()
 
     config = load_config(args.config)
@@ -216,9 +492,23 @@ def main():
             "--keychain_service with --username (or config/default $USER) to retrieve the API key."
         )
     
-    # Prompt for origin if not provided
-    origin = args.origin
-    if not origin:
+    origins = args.origin or []
+    destinations = args.destination or []
+    if len(origins) != len(destinations):
+        parser.error("--origin and --destination must be given the same number of times.")
+
+    if args.routes_file:
+        with open(args.routes_file, newline="", encoding="utf-8") as f:
+            for line_no, row in enumerate(csv.reader(f), start=1):
+                if not row or row[0].lstrip().startswith("#"):
+                    continue
+                if len(row) != 2:
+                    parser.error(f"{args.routes_file}:{line_no}: expected 'origin,destination', got {len(row)} fields.")
+                origins.append(row[0].strip())
+                destinations.append(row[1].strip())
+
+    # Prompt for a single route if none was provided on the command line
+    if not origins:
         default_origin = "6, avenue des Hauts-Fourneaux, L-4362 Esch-sur-Alzette"
         print(f"\nOrigin address [default: {default_origin}]:")
         print("(e.g., 'Luxembourg Airport' or 'Gare Centrale Luxembourg')")
@@ -226,30 +516,71 @@ def main():
         if not origin:
             origin = default_origin
             print(f"Using default origin: {origin}")
-    
-    # Prompt for destination if not provided
-    destination = args.destination
-    if not destination:
+
         print("\nDestination address (e.g., 'Gare Centrale Luxembourg' or 'Place d'Armes, Luxembourg City'):")
         destination = input("> ").strip()
         if not destination:
             print("Error: Destination address is required.")
             sys.exit(1)
-    
-    # Prompt for output filename if not provided
+
+        origins = [origin]
+        destinations = [destination]
+
+    # Prompt for output filename if not provided (single-route runs only)
     output_file = args.output
-    if not output_file:
+    if not output_file and len(origins) == 1:
         output_file = input("Enter output PDF filename (press Enter for auto-generated name): ")
         output_file = output_file.strip() or None
-    
+
     # Validate output filename if provided
     if output_file:
         output_path = Path(output_file)
         if output_path.suffix.lower() != '.pdf':
             output_file = str(output_path.with_suffix('.pdf'))
             print(f"Output filename changed to: {output_file}")
-    
-    create_pdf(api_key, origin, destination, output_file)
+
+    # With --no-maps, grab distances for pairs sharing an origin in batched
+    # route-matrix calls (one request per 25 pairs instead of one per pair).
+    routes = [None] * len(origins)
+    if args.no_maps:
+        by_origin = {}
+        for index, origin in enumerate(origins):
+            by_origin.setdefault(origin, []).append(index)
+        for origin, indices in by_origin.items():
+            matrix = compute_route_matrix(api_key, origin, [destinations[i] for i in indices])
+            for i, (distance, duration) in zip(indices, matrix):
+                routes[i] = (distance, duration, None)
+
+    if len(origins) == 1:
+        create_pdf(api_key, origins[0], destinations[0], output_file, routes[0])
+        return
+
+    # Each route is network-bound, so a thread pool overlaps the HTTP round-trips
+    # and wall time approaches the slowest route instead of the sum of all routes.
+    timestamp = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+    base = Path(output_file) if output_file else Path(f"route_map_{timestamp}.pdf")
+    failures = 0
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = {
+            executor.submit(
+                create_pdf,
+                api_key,
+                origin,
+                destination,
+                str(base.with_name(f"{base.stem}_{index}{base.suffix}")),
+                routes[index - 1],
+            ): (origin, destination)
+            for index, (origin, destination) in enumerate(zip(origins, destinations), start=1)
+        }
+        for future in as_completed(futures):
+            origin, destination = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error generating route {origin} -> {destination}: {e}")
+                failures += 1
+    if failures:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()